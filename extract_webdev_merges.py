@@ -1,19 +1,31 @@
+import os
 import subprocess
 import sys
 import re
 import argparse
 
 
-def get_git_merge_commits(since_ref: str = None, max_count: int = 500):
+def get_git_merge_commits(since_ref: str = None, max_count: int = 500, prefix: str = None):
     """
     Получает последние merge-коммиты из git.
+    Строки отдаются по мере того, как git их печатает, без буферизации всего вывода.
+    При заданном $prefix отбор по названию ветки выполняет сам git.
     """
     cmd = ['git', 'log', '--merges', '--oneline', f'--max-count={max_count}']
+    if prefix:
+        cmd += [
+            '--extended-regexp',
+            '--regexp-ignore-case',
+            f"--grep=Merge branch '[^']*/{prefix}-",
+        ]
     if since_ref:
         cmd.append(f'{since_ref}..HEAD')
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        return result.stdout.splitlines()
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True) as proc:
+            for line in proc.stdout:
+                yield line.rstrip('\n')
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
     except subprocess.CalledProcessError as e:
         print(f"❌ Ошибка при выполнении git log: {e}", file=sys.stderr)
         sys.exit(1)
@@ -22,20 +34,33 @@ def get_git_merge_commits(since_ref: str = None, max_count: int = 500):
         sys.exit(1)
 
 
+def read_lines(path: str):
+    """
+    Построчно читает git log из файла.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield line.rstrip('\n')
+
+
 def extract_lines(lines, prefix: str = None):
     """
     Фильтрует строки с $prefix в названии ветки.
     """
     if prefix:
-        pattern = re.compile(rf"Merge branch '([^']*/{prefix}-[^']*)'", re.IGNORECASE)
+        pattern = re.compile(rf"Merge branch '([^']*/{prefix}-[^']*)'", re.IGNORECASE | re.ASCII)
     else:
-        pattern = re.compile(rf"Merge branch ", re.IGNORECASE)
+        pattern = re.compile(rf"Merge branch ", re.IGNORECASE | re.ASCII)
+
+    # Дешёвая проверка подстроки отсекает не-merge строки до запуска regex;
+    # регистр не учитывается, как и в самом шаблоне
+    needle = "merge branch "
 
-    extracted = []
     for line in lines:
+        if needle not in line.lower():
+            continue
         if pattern.search(line):
-            extracted.append(line)
-    return extracted
+            yield line
 
 
 def main():
@@ -71,22 +96,33 @@ def main():
     output = args.output or 'merges.txt'
 
     if args.from_file:
-        with open(args.from_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        lines = read_lines(args.from_file)
     else:
         print(f"🔍 Извлекаю merge-коммиты из git...", file=sys.stderr)
-        lines = get_git_merge_commits(since_ref=args.since, max_count=args.max)
+        lines = get_git_merge_commits(since_ref=args.since, max_count=args.max, prefix=args.prefix)
 
     lines = extract_lines(lines, args.prefix)
 
-    output_text = "\n".join(lines)
-
+    count = 0
     if output:
-        with open(output, 'w', encoding='utf-8') as f:
-            f.write(output_text)
-        print(f"✅ Найдено {len(lines)} merge-коммитов. Сохранено в {output}", file=sys.stderr)
+        # Пишем во временный файл рядом и подменяем $output только после успешного
+        # завершения git, чтобы ошибка не затёрла предыдущий результат
+        tmp_output = f'{output}.tmp'
+        try:
+            with open(tmp_output, 'w', encoding='utf-8') as f:
+                for line in lines:
+                    f.write(line)
+                    f.write('\n')
+                    count += 1
+            os.replace(tmp_output, output)
+        except BaseException:
+            if os.path.exists(tmp_output):
+                os.remove(tmp_output)
+            raise
+        print(f"✅ Найдено {count} merge-коммитов. Сохранено в {output}", file=sys.stderr)
     else:
-        print(f"\nℹ️  Найдено {len(lines)} merge-коммитов.", file=sys.stderr)
+        count = sum(1 for _ in lines)
+        print(f"\nℹ️  Найдено {count} merge-коммитов.", file=sys.stderr)
 
 
 if __name__ == "__main__":
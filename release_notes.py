@@ -1,18 +1,26 @@
 import argparse
+import json
 import re
+import sys
+import time
 from collections import defaultdict
 from datetime import datetime
 from enum import Enum
-from typing import List, Optional, Union, Tuple, Dict
+from operator import itemgetter
+from pathlib import Path
+from typing import List, Optional, Union, Tuple, Dict, Iterator
 
 from dotenv import load_dotenv
 import os
-from jira import JIRA, Issue
+from jira import JIRA
 
 load_dotenv()
 
 JIRA_URL = os.getenv("JIRA_URL")
 JIRA_API_TOKEN = os.getenv("JIRA_API_TOKEN")
+JIRA_BATCH_SIZE = 50  # задач в одном JQL-запросе
+JIRA_CACHE_PATH = Path('.jira_cache.json')
+JIRA_CACHE_TTL = 300  # секунд
 
 
 def get_config() -> Tuple[str, str, datetime, str]:
@@ -32,6 +40,11 @@ def get_config() -> Tuple[str, str, datetime, str]:
         release = input("Release Version: ")
     if not develop:
         develop = input("Develop Version: ")
+    if not prefix:
+        prefix = input("Prefix: ").strip()
+    if not prefix:
+        print("❌ Не задан префикс задач: укажите --prefix или PREFIX в .env")
+        exit(1)
 
     return release, develop, date, prefix
 
@@ -49,12 +62,56 @@ if not all([JIRA_URL, JIRA_API_TOKEN]):
 with open('merges.txt', 'r', encoding='utf-8') as f:
     merge_lines = f.read().splitlines()
 
+# merges.txt может быть склеен из нескольких запусков: дубли разбираем один раз
+merge_lines = list(dict.fromkeys(merge_lines))
+
 
 def list_to_str(ids: Union[List, Tuple], quot: Optional[str] = None) -> str:
     quoted = [f"{quot}{x}{quot}" for x in ids] if quot is not None else map(str, ids)
     return ','.join(quoted)
 
 
+def _is_cache_entry(value) -> bool:
+    if not isinstance(value, list) or len(value) != 3:
+        return False
+    timestamp, summary, status = value
+    return (
+        isinstance(timestamp, (int, float))
+        and isinstance(summary, (str, type(None)))
+        and isinstance(status, (str, type(None)))
+    )
+
+
+def load_issue_cache() -> Dict[str, Tuple[float, Optional[str], Optional[str]]]:
+    """
+    Кэш задач Jira: key -> (timestamp, summary, status).
+    Для задач, не найденных в Jira, summary и status равны None.
+    """
+    try:
+        with JIRA_CACHE_PATH.open('r', encoding='utf-8') as f:
+            raw = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    # Повреждённый файл или запись считаем промахом кэша
+    if not isinstance(raw, dict):
+        return {}
+    return {key: tuple(value) for key, value in raw.items() if _is_cache_entry(value)}
+
+
+def save_issue_cache(cache: Dict[str, Tuple[float, Optional[str], Optional[str]]]) -> None:
+    # Устаревшие записи не сохраняем, чтобы файл не рос бесконечно
+    now = time.time()
+    actual = {key: value for key, value in cache.items() if now - value[0] < JIRA_CACHE_TTL}
+    with JIRA_CACHE_PATH.open('w', encoding='utf-8') as f:
+        json.dump(actual, f, ensure_ascii=False)
+
+
+def chunks(seq: List, size: int) -> Iterator[List]:
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
 class BranchType(tuple, Enum):
     FEATURE = ('feature',)
     MOD = ('mod', 'modification', 'refactor')
@@ -67,62 +124,55 @@ class BranchType(tuple, Enum):
 
     @classmethod
     def classify_branch_type(cls, pref: str) -> 'BranchType':
-        pref = pref.lower()
-
-        if pref in cls.FEATURE:
-            return cls.FEATURE
-        elif pref in cls.MOD:
-            return cls.MOD
-        elif pref in cls.BUGFIX:
-            return cls.BUGFIX
+        return _PREFIX_TO_TYPE.get(pref.lower(), cls.OTHER)
 
-        else:
-            return cls.OTHER
 
+# Префикс ветки -> тип: 'fix' -> BranchType.BUGFIX и т.п.
+_PREFIX_TO_TYPE: Dict[str, BranchType] = {
+    alias: b_type
+    for b_type in (BranchType.FEATURE, BranchType.MOD, BranchType.BUGFIX)
+    for alias in b_type.value
+}
 
 feature_types = list_to_str(BranchType.FEATURE, quot='`')
 mod_types = list_to_str(BranchType.MOD, quot='`')
 bugfix_types = list_to_str(BranchType.BUGFIX, quot='`')
 other_types = list_to_str(BranchType.OTHER, quot='`')
 
+GROUP_FEATURE = f'Функциональность ({feature_types})'
+GROUP_MOD = f'Доработки / Модификации ({mod_types})'
+GROUP_BUGFIX = f'Багфиксы ({bugfix_types})'
+GROUP_OTHER = f'Прочее ({other_types})'
+
+GROUP_BY_TYPE: Dict[BranchType, str] = {
+    BranchType.FEATURE: GROUP_FEATURE,
+    BranchType.MOD: GROUP_MOD,
+    BranchType.BUGFIX: GROUP_BUGFIX,
+    BranchType.OTHER: GROUP_OTHER,
+}
+
 # === ПАРСИНГ ЗАДАЧ ===
-tasks = {}  # base_key -> branch_type
-base_key_pattern = re.compile(fr'^({ISSUE_PREFIX}-\d+)')
+tasks = {}  # base_key -> (branch_type, числовой ID)
+# Тип ветки и базовый номер: WEBDEV-**** из 'feature/WEBDEV-****-v2' и т.п.
+merge_line_pattern = re.compile(
+    fr"Merge branch '(?P<type>[^/']+)/(?P<key>{re.escape(ISSUE_PREFIX)}-(?P<num>\d+))[^']*'",
+    re.ASCII,
+)
 
 for line in merge_lines:
     line = line.strip()
     if not line or "refs/heads/develop" in line or "remote-tracking" in line:
         continue
 
-    m = re.search(r"Merge branch '([^']+)'", line)
+    m = merge_line_pattern.search(line)
     if not m:
         continue
 
-    full_branch = m.group(1)
-    if '/' not in full_branch:
-        continue
-
-    try:
-        prefix, task_key = full_branch.split('/', 1)
-    except ValueError:
-        continue
-
-    if not task_key.startswith(f'{ISSUE_PREFIX}-'):
-        continue
-
-    # Пропускаем явные опечатки (например, WEBDEB)
-    if ISSUE_PREFIX in task_key.lower():
-        continue
-
-    # Извлекаем базовый номер: WEBDEV-**** из WEBDEV-****-v2 и т.п.
-    base_match = base_key_pattern.match(task_key)
-    if not base_match:
-        continue
-    base_key = base_match.group(1)
+    # Опечатки вида WEBDEB-**** отсекаются самим шаблоном
+    prefix, base_key = m.group('type'), m.group('key')
 
-    branch_type = BranchType.classify_branch_type(prefix)
-    if base_key not in tasks:
-        tasks[base_key] = branch_type
+    branch_type = _PREFIX_TO_TYPE.get(prefix.lower(), BranchType.OTHER)
+    tasks.setdefault(base_key, (branch_type, int(m.group('num'))))
 
 # === ЗАПРОС К JIRA ===
 base_keys = list(tasks.keys())
@@ -131,30 +181,54 @@ if not base_keys:
     print(f"Нет корректных задач {ISSUE_PREFIX} для обработки.")
     exit()
 
-print(f"Запрашиваю {len(base_keys)} задач из Jira...")
-
-jira_api = JIRA(
-    JIRA_URL,
-    token_auth=JIRA_API_TOKEN,
-)
-
-issue_data: Dict[str, Optional[Issue]] = {}
-
-# Формируем JQL: issueKey in (WEBDEV-1, WEBDEV-2, ...)
-jql = f"issueKey IN ({','.join(base_keys)})"
+# Задачи из кэша, которые ещё не устарели, повторно не запрашиваем
+issue_cache = load_issue_cache()
+now = time.time()
 
-try:
-    # Получаем все задачи за один запрос
-    issues = jira_api.search_issues(
-        jql,
-        fields="summary,status",  # запрашиваем только нужные поля
-        maxResults=len(base_keys)
+issue_data: Dict[str, Optional[Tuple[str, str]]] = {}
+fresh_keys = []
+for key in base_keys:
+    cached = issue_cache.get(key)
+    if cached and now - cached[0] < JIRA_CACHE_TTL:
+        issue_data[key] = (cached[1], cached[2]) if cached[1] is not None else None
+    else:
+        fresh_keys.append(key)
+
+if fresh_keys:
+    print(f"Запрашиваю {len(fresh_keys)} задач из Jira...")
+
+    jira_api = JIRA(
+        JIRA_URL,
+        token_auth=JIRA_API_TOKEN,
     )
-except Exception as e:
-    print(f"❌ Ошибка при запросе к Jira: {e}")
-    exit(1)
 
-issue_data: Dict[str, Optional[Issue]] = {issue.key: issue for issue in issues}
+    try:
+        # Запрашиваем задачи пачками, чтобы JQL не упирался в лимит длины запроса
+        for chunk in chunks(fresh_keys, JIRA_BATCH_SIZE):
+            # Формируем JQL: issueKey in (WEBDEV-1, WEBDEV-2, ...)
+            jql = f"issueKey IN ({','.join(chunk)})"
+            result = jira_api.search_issues(
+                jql,
+                fields="summary,status",  # запрашиваем только нужные поля
+                expand=None,
+                maxResults=len(chunk),
+                json_result=True,  # сырой JSON вместо объектов Issue
+            )
+            for issue in result['issues']:
+                fields = issue['fields']
+                summary, status = fields['summary'], fields['status']['name']
+                issue_data[issue['key']] = (summary, status)
+                issue_cache[issue['key']] = (now, summary, status)
+    except Exception as e:
+        print(f"❌ Ошибка при запросе к Jira: {e}")
+        exit(1)
+
+    # Ненайденные задачи тоже кэшируем, чтобы не запрашивать их при каждом запуске
+    for key in fresh_keys:
+        if key not in issue_data:
+            issue_cache[key] = (now, None, None)
+
+    save_issue_cache(issue_cache)
 
 # Для отсутствующих задач - заглушка
 for key in base_keys:
@@ -163,61 +237,54 @@ for key in base_keys:
 
 
 # === ГРУППИРОВКА ===
-def make_group(jira_tasks: Dict[str, BranchType]) -> Dict[str, List]:
+def make_group(jira_tasks: Dict[str, Tuple[BranchType, int]]) -> Dict[str, List[Tuple[str, int]]]:
     jira_groups = defaultdict(list)
-    for k, b_type in jira_tasks.items():
-        if b_type == BranchType.FEATURE:
-            jira_groups[f'Функциональность ({feature_types})'].append(k)
-        elif b_type == BranchType.MOD:
-            jira_groups[f'Доработки / Модификации ({mod_types})'].append(k)
-        elif b_type == BranchType.BUGFIX:
-            jira_groups[f'Багфиксы ({bugfix_types})'].append(k)
-        else:
-            jira_groups[f'Прочее ({other_types}'].append(k)
+    for k, (b_type, num) in jira_tasks.items():
+        jira_groups[GROUP_BY_TYPE[b_type]].append((k, num))
 
     return jira_groups
 
 
 groups = make_group(tasks)
 
+
 # === ФОРМИРОВАНИЕ ВЫВОДА ===
-output_lines = []
-output_lines.append("### Release Notes")
-output_lines.append("")
-output_lines.append(f"Release Version: {RELEASE_VERSION}")
-output_lines.append(f"Develop Version: {DEVELOP_VERSION}")
-output_lines.append(f"Дата релиза: {RELEASE_DATE}")
-output_lines.append("")
-output_lines.append("### Основные изменения:")
-output_lines.append("")
-
-# Сортируем задачи по номеру внутри каждой группы
-for group_name in groups.keys():
-    keys = groups[group_name]
-    if not keys:
-        continue
-    output_lines.append(f"- **{group_name}:**")
-    # Сортировка по числовому ID: WEBDEV-100 → 100
-    sorted_keys = sorted(keys, key=lambda x: int(x.split('-')[1]))
-    for key in sorted_keys:
-        issue = issue_data[key]
+def format_task(key: str) -> str:
+    issue = issue_data[key]
+
+    if issue:
+        title, status = issue
+        title = title.strip()
+    else:
+        title = '[Название не найдено]'
+        status = '[Todo]'
 
-        if issue:
-            title = issue_data[key].fields.summary.strip()
-            status = issue_data[key].fields.status.__str__()
-        else:
-            title = '[Название не найдено]'
-            status = '[Todo]'
+    return f"  + {title} (задача {key})[{status}]"
 
-        output_lines.append(f"  + {title} (задача {key})[{status}]")
-    output_lines.append("")
 
-output_lines.append("#release #backend #patch")
+header = f"""### Release Notes
+
+Release Version: {RELEASE_VERSION}
+Develop Version: {DEVELOP_VERSION}
+Дата релиза: {RELEASE_DATE}
+
+### Основные изменения:
+
+"""
+
+# Сортируем задачи по номеру внутри каждой группы: WEBDEV-100 → 100
+body = "".join(
+    f"- **{group_name}:**\n"
+    + "\n".join(format_task(key) for key, _ in sorted(keys, key=itemgetter(1)))
+    + "\n\n"
+    for group_name, keys in groups.items()
+    if keys
+)
 
 # === ВЫВОД ===
-final_output = "\n".join(output_lines)
+final_output = f"{header}{body}#release #backend #patch"
 
-with open("release_notes.md", "w") as f:
-    f.write(final_output)
+Path("release_notes.md").write_text(final_output, encoding='utf-8')
 
-print(final_output)
+sys.stdout.write(final_output)
+sys.stdout.write("\n")